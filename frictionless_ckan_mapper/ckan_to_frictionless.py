@@ -1,23 +1,87 @@
 # coding=utf-8
 import json
+import re
+from operator import itemgetter
 
 try:
     json_parse_exception = json.decoder.JSONDecodeError
 except AttributeError:  # Testing against Python 2
     json_parse_exception = ValueError
 
+# orjson is an optional speedup for decoding the many small JSON blobs CKAN
+# stores as strings.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson decodes integers that don't fit in 64 bits (19+ digits) as floats,
+# losing precision, so any input with such a run of digits goes to the stdlib
+_long_digit_run = re.compile(u'[0-9]{19}')
+_long_digit_run_bytes = re.compile(b'[0-9]{19}')
+
+
+def _json_loads(value):
+    '''json.loads, using orjson first when it is installed.
+
+    The result doesn't depend on orjson being installed: input orjson would
+    decode differently (big integers) skips it, and input it rejects but the
+    stdlib accepts (NaN, Infinity, out of range floats, lone surrogates) gets
+    a second try with the stdlib. Errors are raised by the stdlib and caught
+    with `json_parse_exception` as usual.
+    '''
+    if orjson is not None and isinstance(value, (str, bytes)):
+        if isinstance(value, bytes):
+            long_digits = _long_digit_run_bytes.search(value)
+        else:
+            long_digits = _long_digit_run.search(value)
+        if long_digits is None:
+            try:
+                return orjson.loads(value)
+            except orjson.JSONDecodeError:
+                pass
+    return json.loads(value)
+
 
 resource_mapping = {
     'size': 'bytes',
     'mimetype': 'mediatype',
     'url': 'path'
 }
+# Frictionless key => CKAN key mapped onto it. When both keys are in the CKAN
+# dict the mapped value wins (even if null) whatever the key order.
+_resource_mapped_from = dict((v, k) for k, v in resource_mapping.items())
 
-resource_keys_to_remove = [
+resource_keys_to_remove = frozenset([
     'position',
     'datastore_active',
     'state'
-]
+])
+
+# First characters of a jsonified array or dict. A set rather than the
+# string '{[' so that the empty string is not a member.
+_jsonified_starts = frozenset('{[')
+
+
+def _maybe_unjson(value):
+    '''JSON load a string value if it looks like a jsonified array or dict.
+
+    HACK: bit of a hacky way to check: look at the first non whitespace
+    character and only json.loads if it is [ or {. Anything else, including
+    strings that fail to parse, is returned unchanged.
+
+    Callers only pass values whose first character is in _jsonified_starts
+    or is whitespace (see resource()), as most values are plain strings
+    that need neither a copy nor a function call. Whitespace is whatever
+    str.strip() removes, not only the JSON whitespace characters.
+    '''
+    stripped = value.strip()
+    if stripped[:1] not in _jsonified_starts:
+        return value
+    try:
+        return _json_loads(stripped)
+    except json_parse_exception:
+        return value
 
 
 def resource(ckandict):
@@ -32,94 +96,109 @@ def resource(ckandict):
     3. Map keys from CKAN to Frictionless (and reformat if needed)
     4. Remove keys with null values (CKAN has a lot of null valued keys)
     5. Apply special formatting (if any) for key fields e.g. slugiify
+
+    Steps 1-4 are done in a single pass over the CKAN dict.
     '''
-    # TODO: delete keys last as may be needed for something in processing
-    resource = dict(ckandict)
-    for key in resource_keys_to_remove:
-        if key in resource:
-            del resource[key]
-
-    # unjsonify values
-    # * check if string
-    # * if starts with [ or { => json.loads it ...
-    # HACK: bit of a hacky way to check if value is a jsonified array or
-    # dict
-    # * else do nothing
-    for key, value in resource.items():
+    resource = {}
+    for key, value in ckandict.items():
+        if value is None or key in resource_keys_to_remove:
+            continue
+        if _resource_mapped_from.get(key) in ckandict:
+            continue
+
+        # Most values are plain strings, so only call _maybe_unjson when the
+        # first character could open a jsonified array or dict (or is
+        # whitespace in front of one).
         if isinstance(value, str):
-            value = value.strip()
-            if value.startswith('{') or value.startswith('['):
-                try:
-                    value = json.loads(value)
-                    resource[key] = value
-                except (json_parse_exception, TypeError):
-                    pass
-
-    # Remap differences from CKAN to Frictionless resource
-    for key, value in resource_mapping.items():
-        if key in resource:
-            resource[value] = resource[key]
-            del resource[key]
-
-    for key in list(resource.keys()):
-        if resource[key] is None:
-            del resource[key]
+            first = value[:1]
+            if first in _jsonified_starts or first.isspace():
+                value = _maybe_unjson(value)
+
+        # Remap differences from CKAN to Frictionless resource
+        resource[resource_mapping.get(key, key)] = value
 
     return resource
 
 
-dataset_keys_to_remove = [
+dataset_keys_to_remove = frozenset([
     'state',          # b/c this is state info not metadata about dataset
     'isopen',         # computed info from license (render info not metadata)
     'num_resources',  # render info not metadata
     'num_tags',       # ditto
     'organization',   # already have owner_org id + this inlines related object
-]
+])
 dataset_mapping = {
     'notes': 'description',
     'url': 'homepage'
 }
+# Same as _resource_mapped_from
+_dataset_mapped_from = dict((v, k) for k, v in dataset_mapping.items())
+# (CKAN key used as contributor role, CKAN key holding its email)
+dataset_contributor_keys = (
+    ('author', 'author_email'),
+    ('maintainer', 'maintainer_email'),
+)
+
+
+def _expand_extras(ckandict, outdict):
+    '''Convert the structure of CKAN extras into keys of outdict.
+
+    Structure of extra item is {key: xxx, value: xxx}. Values are JSON loaded
+    when possible (on error the string is kept).
+    '''
+    for extra in ckandict.get('extras') or []:
+        key = extra['key']
+        value = extra['value']
+        try:
+            value = _json_loads(value)
+        except (json_parse_exception, TypeError):
+            pass
+        if key in dataset_keys_to_remove:
+            continue
+        # keys mapped from the CKAN dict take precedence over extras
+        if key in dataset_mapping and key in ckandict:
+            continue
+        if _dataset_mapped_from.get(key) in ckandict:
+            continue
+        if value is None:
+            # a null extra removes the root key of the same name
+            outdict.pop(key, None)
+            continue
+        outdict[key] = value
 
 
 def dataset(ckandict):
     '''Convert a CKAN Package (Dataset) to Frictionless Package.
 
-    1. Expand extras.
+    1. Map keys from CKAN to Frictionless (and reformat if needed)
+    2. Remove keys with null values (CKAN has a lot of null valued keys)
+    3. Remove unneeded keys
+    4. Expand extras (see _expand_extras).
         * JSON loads everything and on error have a string
-    2. Map keys from CKAN to Frictionless (and reformat if needed)
-    3. Remove keys with null values (CKAN has a lot of null valued keys)
-    4. Remove unneeded keys
     5. Apply special formatting for key fields
+
+    Steps 1-3 are done in a single pass over the CKAN dict.
     '''
-    outdict = dict(ckandict)
-    # Convert the structure of extras
-    # structure of extra item is {key: xxx, value: xxx}
-    if 'extras' in ckandict:
-        for extra in ckandict['extras']:
-            key = extra['key']
-            value = extra['value']
-            try:
-                value = json.loads(value)
-            except (json_parse_exception, TypeError):
-                pass
-            outdict[key] = value
-        del outdict['extras']
+    # Map dataset keys, dropping unneeded and null valued keys on the way
+    outdict = {}
+    for key, value in ckandict.items():
+        if (value is None or key in dataset_keys_to_remove or
+                key == 'extras' or _dataset_mapped_from.get(key) in ckandict):
+            continue
+        outdict[dataset_mapping.get(key, key)] = value
 
-    # Map dataset keys
-    for key, value in dataset_mapping.items():
-        if key in ckandict:
-            outdict[value] = ckandict[key]
-            del outdict[key]
+    _expand_extras(ckandict, outdict)
 
     # map resources inside dataset
-    if 'resources' in ckandict:
-        outdict['resources'] = [resource(res) for res in
-                                ckandict['resources']]
+    resources = ckandict.get('resources')
+    if resources is not None:
+        outdict['resources'] = list(map(resource, resources))
 
-    # tags
-    if ckandict.get('tags'):
-        outdict['keywords'] = [tag['name'] for tag in ckandict['tags']]
+    # tags (from the CKAN dict, not a `tags` extra, which is dropped)
+    tags = ckandict.get('tags')
     outdict.pop('tags', None)
+    if tags:
+        outdict['keywords'] = list(map(itemgetter('name'), tags))
 
     # author, maintainer => contributors
     # what to do if contributors already there? Options:
@@ -128,56 +207,59 @@ def dataset(ckandict):
     # 3. merge i.e. use contributors and merge in (this is sort of complex)
     # e.g. how to i avoid duplicating the same person
     # ANS: for now, is 1 ...
-    if (not ('contributors' in outdict and outdict['contributors']) and
-            ('author' in outdict or 'maintainer' in outdict)):
-        outdict['contributors'] = []
-        if 'author' in outdict and outdict['author']:
-            contrib = {
-                'title': outdict['author'],
-                'role': 'author'
-            }
-            if 'author_email' in outdict:
-                contrib['email'] = outdict['author_email']
-            outdict['contributors'].append(contrib)
-        if 'maintainer' in outdict and outdict['maintainer']:
+    # The author/maintainer fields are popped as they are read so none of
+    # them are left in the output (null values were already dropped above).
+    contributors = []
+    for role, email_key in dataset_contributor_keys:
+        title = outdict.pop(role, None)
+        email = outdict.pop(email_key, None)
+        if title:
             contrib = {
-                'title': outdict['maintainer'],
-                'role': 'maintainer'
+                'title': title,
+                'role': role
             }
-            if 'maintainer_email' in outdict:
-                contrib['email'] = outdict['maintainer_email']
-            outdict['contributors'].append(contrib)
-
-    for key in ['author', 'author_email', 'maintainer', 'maintainer_email']:
-        outdict.pop(key, None)
+            if email is not None:
+                contrib['email'] = email
+            contributors.append(contrib)
+    if contributors and not outdict.get('contributors'):
+        outdict['contributors'] = contributors
 
     # Algorithm for licenses
-    # 1. Use extras first
+    # 1. Use extras first (a `licenses` extra was already loaded into outdict
+    # by _expand_extras above, no need to scan them again)
     # 2. Updating first item in licenses array (if already there -
     # or create it as empty) with stuff at root of ckan dict i.e.
     # values from license_id, license_title etc.
 
-    # Looping like this because all those keys are optional according to the
-    # docs (though usually license_id will be there if others are there).
-    for key in ['license_id', 'license_title', 'license_url']:
-        if key in outdict and 'licenses' not in outdict:
-            outdict['licenses'] = [{}]
-            break  # check to create list of dicts only once
-    if 'license_id' in outdict:
-        outdict['licenses'][0]['name'] = outdict['license_id']
-        outdict.pop('license_id', None)
-    if 'license_title' in outdict:
-        outdict['licenses'][0]['title'] = outdict['license_title']
-        outdict.pop('license_title', None)
-    if 'license_url' in outdict:
-        outdict['licenses'][0]['path'] = outdict['license_url']
-        outdict.pop('license_url', None)
-
-    for key in dataset_keys_to_remove:
-        outdict.pop(key, None)
-
-    for key in list(outdict.keys()):
-        if outdict[key] is None:
-            del outdict[key]
+    # All those keys are optional according to the docs (though usually
+    # license_id will be there if others are there). Null values are already
+    # stripped so None means the key is missing.
+    license = {}
+    value = outdict.pop('license_id', None)
+    if value is not None:
+        license['name'] = value
+    value = outdict.pop('license_title', None)
+    if value is not None:
+        license['title'] = value
+    value = outdict.pop('license_url', None)
+    if value is not None:
+        license['path'] = value
+    if license:
+        if outdict.get('licenses'):
+            outdict['licenses'][0].update(license)
+        else:
+            outdict['licenses'] = [license]
 
     return outdict
+
+
+def load_and_convert(path):
+    '''Load a CKAN Package (Dataset) from a JSON file and convert it.
+
+    The file is read as bytes and handed straight to the JSON parser, which
+    with orjson avoids decoding it to a string first. Prefer this over
+    json.load() followed by dataset() for large (10 MB+) packages.
+    '''
+    with open(path, 'rb') as f:
+        ckandict = _json_loads(f.read())
+    return dataset(ckandict)
@@ -1,11 +1,18 @@
 # coding=utf-8
 import json
+from operator import itemgetter
 
 try:
     json_parse_exception = json.decoder.JSONDecodeError
 except AttributeError:  # Testing against Python 2
     json_parse_exception = ValueError
 
+# Unlike decoding in ckan_to_frictionless, extras are always encoded with the
+# stdlib json module and not orjson: orjson writes compact separators and
+# unescaped non-ASCII, which would change the JSON strings stored in CKAN
+# extras compared to what existing CKAN instances already hold.
+_json_dumps = json.dumps
+
 
 resource_mapping = {
     'bytes': 'size',
@@ -18,10 +25,10 @@ package_mapping = {
     'homepage': 'url',
 }
 
-# Any key not in this list is passed as is inside "extras".
+# Any key not in this set is passed as is inside "extras".
 # Further processing will happen for possible matchings, e.g.
 # contributor <=> author
-ckan_package_keys = [
+ckan_package_keys = frozenset([
     'author',
     'author_email',
     'creator_user_id',
@@ -49,11 +56,16 @@ ckan_package_keys = [
     'type',
     'url',
     'version'
-]
+])
 
-frictionless_package_keys_to_exclude = [
+frictionless_package_keys_to_exclude = frozenset([
     'extras'
-]
+])
+
+# Keys copied as is into the CKAN package, checked with a single lookup
+_package_passthrough_keys = (
+    ckan_package_keys | frictionless_package_keys_to_exclude
+)
 
 
 def resource(fddict):
@@ -75,6 +87,94 @@ def resource(fddict):
     return resource
 
 
+def _append_extra(extras, key, value):
+    if isinstance(value, (dict, list)):
+        value = _json_dumps(value)
+    extras.append({'key': key, 'value': value})
+
+
+def _resources_to_ckan(resources, outdict, extras):
+    if resources is not None:
+        resources = list(map(resource, resources))
+    outdict['resources'] = resources
+
+
+def _licenses_to_ckan(licenses, outdict, extras):
+    if not licenses:
+        _append_extra(extras, 'licenses', licenses)
+        return
+
+    license = licenses[0]
+    outdict['license_id'] = license.get('name')
+    outdict['license_title'] = license.get('title')
+    outdict['license_url'] = license.get('path')
+    # only keep it (in extras) if there is more than what ckan core can hold
+    if len(licenses) != 1:
+        _append_extra(extras, 'licenses', licenses)
+
+
+def _contributors_to_ckan(contributors, outdict, extras):
+    if not contributors:
+        _append_extra(extras, 'contributors', contributors)
+        return
+
+    # first author (or contributor without a role) and first maintainer
+    author = maintainer = None
+    for c in contributors:
+        role = c.get('role')
+        if role in [None, 'author'] and author is None:
+            author = c
+        elif role == 'maintainer' and maintainer is None:
+            maintainer = c
+        if author is not None and maintainer is not None:
+            break
+    if author is not None:
+        outdict['author'] = author.get('title')
+        outdict['author_email'] = author.get('email')
+    if maintainer is not None:
+        outdict['maintainer'] = maintainer.get('title')
+        outdict['maintainer_email'] = maintainer.get('email')
+
+    # we drop contributors where we have extracted everything into
+    # ckan core that way it won't end up in extras
+    # this helps ensure that round tripping with ckan is good
+    # when have we extracted everything?
+    # if contributors has length 1 and role in author or maintainer
+    # or contributors == 2 and no of authors and maintainer types <= 1
+    if (
+        (len(contributors) == 1 and
+            contributors[0].get('role') in [None, 'author', 'maintainer'])
+        or
+        (len(contributors) == 2 and
+            [c.get('role') for c in contributors]
+            not in (
+                [None, None],
+                ['maintainer', 'maintainer'],
+                ['author', 'author']))
+    ):
+        return
+    _append_extra(extras, 'contributors', contributors)
+
+
+def _keywords_to_ckan(keywords, outdict, extras):
+    if not keywords:
+        _append_extra(extras, 'keywords', keywords)
+        return
+
+    outdict['tags'] = [
+        {'name': keyword} for keyword in keywords
+    ]
+
+
+# Frictionless package keys needing more than a copy or a rename
+_package_handlers = {
+    'resources': _resources_to_ckan,
+    'licenses': _licenses_to_ckan,
+    'contributors': _contributors_to_ckan,
+    'keywords': _keywords_to_ckan,
+}
+
+
 def package(fddict):
     '''Convert a Frictionless package to a CKAN package (dataset).
 
@@ -83,80 +183,29 @@ def package(fddict):
     1. Map keys from Frictionless to CKAN (and reformat if needed).
     2. Apply special formatting (if any) for key fields.
     3. Copy extras across inside the "extras" key.
+
+    All of this is done in a single pass over the package keys.
     '''
-    outdict = dict(fddict)
-
-    # Map data package keys
-    for key, value in package_mapping.items():
-        if key in fddict:
-            outdict[value] = fddict[key]
-            del outdict[key]
-
-    # map resources inside dataset
-    if 'resources' in fddict:
-        outdict['resources'] = [resource(res) for res in fddict['resources']]
-
-    if 'licenses' in outdict and outdict['licenses']:
-        outdict['license_id'] = outdict['licenses'][0].get('name')
-        outdict['license_title'] = outdict['licenses'][0].get('title')
-        outdict['license_url'] = outdict['licenses'][0].get('path')
-        # remove it so it won't get put in extras
-        if len(outdict['licenses']) == 1:
-            outdict.pop('licenses', None)
-
-    if outdict.get('contributors'):
-        for c in outdict['contributors']:
-            if c.get('role') in [None, 'author']:
-                outdict['author'] = c.get('title')
-                outdict['author_email'] = c.get('email')
-                break
-
-        for c in outdict['contributors']:
-            if c.get('role') == 'maintainer':
-                outdict['maintainer'] = c.get('title')
-                outdict['maintainer_email'] = c.get('email')
-                break
-
-        # we remove contributors where we have extracted everything into
-        # ckan core that way it won't end up in extras
-        # this helps ensure that round tripping with ckan is good
-        # when have we extracted everything?
-        # if contributors has length 1 and role in author or maintainer
-        # or contributors == 2 and no of authors and maintainer types <= 1
-        if (
-            (len(outdict.get('contributors')) == 1 and
-                outdict['contributors'][0].get('role') in [None, 'author',
-                    'maintainer'])
-            or
-            (len(outdict.get('contributors')) == 2 and
-                [c.get('role') for c in outdict['contributors']]
-                not in (
-                    [None, None],
-                    ['maintainer', 'maintainer'],
-                    ['author', 'author']))
-                    ):
-            outdict.pop('contributors', None)
-
-    if outdict.get('keywords'):
-        outdict['tags'] = [
-            {'name': keyword} for keyword in outdict['keywords']
-        ]
-        del outdict['keywords']
-
-    final_dict = dict(outdict)
-    for key, value in outdict.items():
-        if (
-            key not in ckan_package_keys and
-            key not in frictionless_package_keys_to_exclude
-        ):
-            if isinstance(value, (dict, list)):
-                value = json.dumps(value)
-            if not final_dict.get('extras'):
-                final_dict['extras'] = []
-            final_dict['extras'].append(
-                {'key': key, 'value': value}
-            )
-            del final_dict[key]
-    outdict = dict(final_dict)
+    outdict = {}
+    extras = []
+    for key, value in fddict.items():
+        handler = _package_handlers.get(key)
+        if handler is not None:
+            handler(value, outdict, extras)
+        elif key in package_mapping:
+            # Map data package keys
+            outdict[package_mapping[key]] = value
+        elif key in _package_passthrough_keys:
+            # Mapped and handled keys take precedence over a plain copy of a
+            # CKAN key, whatever the key order
+            if key not in outdict:
+                outdict[key] = value
+        else:
+            _append_extra(extras, key, value)
+    if extras:
+        # Sorted by key so the output doesn't depend on the input key order.
+        # Extras already on the input are kept first, as they are.
+        extras.sort(key=itemgetter('key'))
+        outdict['extras'] = list(fddict.get('extras') or []) + extras
 
     return outdict
@@ -2,6 +2,9 @@
 
 import json
 
+import pytest
+import six
+
 import frictionless_ckan_mapper.ckan_to_frictionless as converter
 
 
@@ -54,6 +57,65 @@ class TestResourceConversion:
         out = converter.resource(indict)
         assert out == exp
 
+    def test_values_with_surrounding_whitespace_are_unjsonified(self):
+        indict = {
+            'a': ' [1] ',
+            'b': '\n{"a": 1}\t',
+            'c': '\x0c[1]\x0b',
+            'd': ' hello',
+            'e': ''
+        }
+        exp = {
+            'a': [1],
+            'b': {'a': 1},
+            'c': [1],
+            'd': ' hello',
+            'e': ''
+        }
+        out = converter.resource(indict)
+        assert out == exp
+
+        # Unicode whitespace is stripped too (str is bytes on Python 2)
+        if not six.PY2:
+            out = converter.resource({'a': '\xa0[1]\u3000'})
+            assert out == {'a': [1]}
+
+    def test_values_are_unjsonified_without_orjson(self, monkeypatch):
+        monkeypatch.setattr(converter, 'orjson', None)
+        indict = {
+            'big': '[9999999999999999999999999]',
+            'inf': '[Infinity, 1e400]',
+            'surrogate': '["\\ud800"]',
+            'x': "{'abc': 1"
+        }
+        exp = {
+            'big': [9999999999999999999999999],
+            'inf': [float('inf'), float('inf')],
+            'surrogate': [u'\ud800'],
+            'x': "{'abc': 1"
+        }
+        out = converter.resource(indict)
+        assert out == exp
+
+    def test_values_are_unjsonified_with_orjson(self):
+        pytest.importorskip('orjson')
+        # orjson would turn the big int into a float and rejects the others,
+        # the stdlib decodes all of them
+        indict = {
+            'big': '{"id": 12345678901234567890123}',
+            'inf': '[Infinity, 1e400]',
+            'surrogate': '["\\ud800"]',
+            'x': "{'abc': 1"
+        }
+        exp = {
+            'big': {'id': 12345678901234567890123},
+            'inf': [float('inf'), float('inf')],
+            'surrogate': [u'\ud800'],
+            'x': "{'abc': 1"
+        }
+        out = converter.resource(indict)
+        assert out == exp
+
     def test_keys_are_removed_that_should_be(self):
         indict = {
             "position": 2,
@@ -78,6 +140,20 @@ class TestResourceConversion:
         out = converter.resource(indict)
         assert out == exp
 
+    def test_mapped_key_wins_over_frictionless_key(self):
+        # whatever the key order, the mapped CKAN value is used
+        for indict in (
+            {'url': 'a', 'path': 'b', 'size': 1, 'bytes': 2},
+            {'path': 'b', 'url': 'a', 'bytes': 2, 'size': 1}
+        ):
+            out = converter.resource(indict)
+            assert out == {'path': 'a', 'bytes': 1}
+
+        # ... even if it is null
+        indict = {'path': 'b', 'url': None}
+        out = converter.resource(indict)
+        assert out == {}
+
     def test_resource_path_is_set_even_for_uploaded_resources(self):
         indict = {
             "url": "http://www.somewhere.com/data.csv",
@@ -169,6 +245,23 @@ class TestPackageConversion:
         }
         assert out == exp
 
+    def test_extras_are_unjsonified_with_orjson(self):
+        pytest.importorskip('orjson')
+        indict = {
+            'extras': [
+                {'key': 'big', 'value': '18446744073709551616'},
+                {'key': 'inf', 'value': '[Infinity]'},
+                {'key': 'last_year', 'value': 2016}
+            ]
+        }
+        exp = {
+            'big': 18446744073709551616,
+            'inf': [float('inf')],
+            'last_year': 2016
+        }
+        out = converter.dataset(indict)
+        assert out == exp
+
     def test_dataset_license(self):
         # No license_title nor license_url
         indict = {
@@ -272,6 +365,46 @@ class TestPackageConversion:
         out = converter.dataset(indict)
         assert out == exp
 
+    def test_mapped_key_wins_over_frictionless_key(self):
+        exp = {'description': 'notes', 'homepage': 'url'}
+        for indict in (
+            {'notes': 'notes', 'description': 'desc',
+             'url': 'url', 'homepage': 'home'},
+            {'description': 'desc', 'notes': 'notes',
+             'homepage': 'home', 'url': 'url'}
+        ):
+            out = converter.dataset(indict)
+            assert out == exp
+
+        indict = {
+            'notes': 'notes',
+            'extras': [
+                {'key': 'description', 'value': 'desc'},
+                {'key': 'notes', 'value': 'extra notes'}
+            ]
+        }
+        out = converter.dataset(indict)
+        assert out == {'description': 'notes'}
+
+    def test_null_extra_removes_root_key(self):
+        indict = {
+            'title': 'title here',
+            'extras': [
+                {'key': 'title', 'value': 'null'}
+            ]
+        }
+        out = converter.dataset(indict)
+        assert out == {}
+
+    def test_resources_extra_is_not_converted(self):
+        indict = {
+            'extras': [
+                {'key': 'resources', 'value': 'see website'}
+            ]
+        }
+        out = converter.dataset(indict)
+        assert out == {'resources': 'see website'}
+
     def test_dataset_author_and_maintainer(self):
         indict = {
             'author': 'World Bank and OECD',
@@ -328,6 +461,32 @@ class TestPackageConversion:
         out = converter.dataset(indict)
         assert out == exp
 
+    def test_null_author_email_is_dropped(self):
+        indict = {
+            'author': 'World Bank and OECD',
+            'author_email': None,
+            'maintainer': None
+        }
+        exp = {
+            'contributors': [{
+                'title': 'World Bank and OECD',
+                'role': 'author'
+            }]
+        }
+        out = converter.dataset(indict)
+        assert out == exp
+
+    def test_empty_author_and_maintainer_are_ignored(self):
+        indict = {
+            'author': '',
+            'author_email': '',
+            'maintainer': '',
+            'maintainer_email': ''
+        }
+        exp = {}
+        out = converter.dataset(indict)
+        assert out == exp
+
     def test_dataset_tags(self):
         indict = {
             'tags': [
@@ -351,6 +510,24 @@ class TestPackageConversion:
         out = converter.dataset(indict)
         assert out == exp
 
+    def test_tags_extra_is_ignored(self):
+        indict = {
+            'extras': [
+                {'key': 'tags', 'value': 'economy, gdp'}
+            ]
+        }
+        out = converter.dataset(indict)
+        assert out == {}
+
+        indict = {
+            'tags': [{'name': 'b'}],
+            'extras': [
+                {'key': 'tags', 'value': '[{"name": "a"}]'}
+            ]
+        }
+        out = converter.dataset(indict)
+        assert out == {'keywords': ['b']}
+
     def test_resources_are_converted(self):
         indict = {
             'name': 'gdp',
@@ -432,3 +609,9 @@ class TestPackageConversion:
         exp = {}
         out = converter.dataset(indict)
         assert out == exp
+
+    def test_load_and_convert(self):
+        inpath = 'tests/fixtures/full_ckan_package.json'
+        exp = converter.dataset(json.load(open(inpath)))
+        out = converter.load_and_convert(inpath)
+        assert out == exp
@@ -89,6 +89,49 @@ class TestPackageConversion:
         out = converter.package(indict)
         assert out == exp
 
+    def test_mapped_keys_win_over_ckan_keys(self):
+        for indict in (
+            {'homepage': 'h', 'url': 'u'},
+            {'url': 'u', 'homepage': 'h'}
+        ):
+            out = converter.package(indict)
+            assert out == {'url': 'h'}
+
+        for indict in (
+            {'description': None, 'notes': {'a': 1}},
+            {'notes': {'a': 1}, 'description': None}
+        ):
+            out = converter.package(indict)
+            assert out == {'notes': None}
+
+    def test_handled_keys_win_over_ckan_keys(self):
+        licenses = [{'name': 'cc-by'}]
+        for indict in (
+            {'licenses': licenses, 'license_id': 'odc-odbl'},
+            {'license_id': 'odc-odbl', 'licenses': licenses}
+        ):
+            out = converter.package(indict)
+            assert out == {
+                'license_id': 'cc-by',
+                'license_title': None,
+                'license_url': None
+            }
+
+        contributors = [{'title': 'John Smith'}]
+        for indict in (
+            {'contributors': contributors, 'author': 'Jane Doe'},
+            {'author': 'Jane Doe', 'contributors': contributors}
+        ):
+            out = converter.package(indict)
+            assert out == {'author': 'John Smith', 'author_email': None}
+
+        for indict in (
+            {'keywords': ['economy'], 'tags': [{'name': 'gdp'}]},
+            {'tags': [{'name': 'gdp'}], 'keywords': ['economy']}
+        ):
+            out = converter.package(indict)
+            assert out == {'tags': [{'name': 'economy'}]}
+
     def test_dataset_license(self):
         indict = {
             'licenses': [{
@@ -261,7 +304,22 @@ class TestPackageConversion:
             ]
         }
         out = converter.package(indict)
-        out['extras'] = sorted(out['extras'], key=lambda i: i['key'])
+        assert out == exp
+
+    def test_extras_are_sorted_by_key(self):
+        indict = {
+            'zzz': 'last',
+            'aaa': 'first',
+            'mmm': [1, 2]
+        }
+        exp = {
+            'extras': [
+                {'key': 'aaa', 'value': 'first'},
+                {'key': 'mmm', 'value': '[1, 2]'},
+                {'key': 'zzz', 'value': 'last'}
+            ]
+        }
+        out = converter.package(indict)
         assert out == exp
 
     def test_resources_are_converted(self):
@@ -284,3 +342,18 @@ class TestPackageConversion:
         out = converter.package(indict)
         assert out == exp
 
+    def test_input_extras_are_not_modified(self):
+        extras = [{'key': 'existing', 'value': 'abc'}]
+        indict = {
+            'extras': extras,
+            'newkey': 'new value'
+        }
+        exp = {
+            'extras': [
+                {'key': 'existing', 'value': 'abc'},
+                {'key': 'newkey', 'value': 'new value'}
+            ]
+        }
+        out = converter.package(indict)
+        assert out == exp
+        assert extras == [{'key': 'existing', 'value': 'abc'}]